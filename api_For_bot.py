@@ -1,4 +1,4 @@
-from fastapi.concurrency import run_in_threadpool
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
 
 import asyncio
 import sys
@@ -12,11 +12,14 @@ import os
 from functools import lru_cache
 from typing import AsyncGenerator, Tuple, Optional
 
+import anyio.to_thread
+import orjson
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from fastapi import APIRouter, HTTPException, Query
+from agno.run.agent import RunContentEvent, RunErrorEvent
 from chatbot import agent
 import random
 
@@ -51,55 +54,73 @@ class ChatEntry(BaseModel):
 import uuid
 
 def generate_conversation_id() -> str:
-    return str(uuid.uuid4())
+    return uuid.uuid4().hex
 
 
-app = FastAPI(title="Bot API", version="1.0.0")
+# Worker threads shared by agent runs and blocking DB calls
+THREADPOOL_SIZE = 32
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
+    # run_in_threadpool dispatches through anyio's default limiter (40 by default)
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    yield
+
+
+app = FastAPI(title="Bot API", version="1.0.0", lifespan=lifespan)
+
+
+def _sse(payload: dict) -> str:
+    return f"data: {orjson.dumps(payload).decode()}\n\n"
+
+
+async def _stream_agent_response(prompt: str, user_id: str, conversation_id: str) -> AsyncGenerator[str, None]:
+    # First frame carries the conversation id so clients can continue the session
+    yield _sse({"conversation_id": conversation_id})
+
+    # agent.run(stream=True) reads/creates the session before returning its
+    # blocking generator, so both the call and each step run in the threadpool
+    events = await run_in_threadpool(
+        agent.run, prompt, stream=True, user_id=user_id, session_id=conversation_id
+    )
+    async for event in iterate_in_threadpool(events):
+        if isinstance(event, RunContentEvent) and isinstance(event.content, str) and event.content:
+            yield _sse({"token": event.content})
+        elif isinstance(event, RunErrorEvent):
+            yield _sse({"error": event.content})
 
 
 @app.post("/conversations")
 async def chat(request: ChatRequest) -> StreamingResponse:
     user_id = request.username
-    conversation_id = conversation_id = str(uuid.uuid4())
-    res = await run_in_threadpool(
-        agent.run,
-        request.prompt,
-        user_id=request.username,
-        session_id=conversation_id,
+    conversation_id = generate_conversation_id()
+    return StreamingResponse(
+        _stream_agent_response(request.prompt, user_id, conversation_id),
+        media_type="text/event-stream",
     )
-    return {
-        "conversation_id": conversation_id,
-        "response": res.content
-    }
 
 @app.post("/conversations/{conversation_id}/messages")
-async def continue_chat(conversation_id: str, request: ContinueChatRequest):
+async def continue_chat(conversation_id: str, request: ContinueChatRequest) -> StreamingResponse:
     user_id = request.username
 
-    res = await run_in_threadpool(
-        agent.run,
-        request.prompt,
-        user_id=request.username,
-        session_id=conversation_id,
+    return StreamingResponse(
+        _stream_agent_response(request.prompt, user_id, conversation_id),
+        media_type="text/event-stream",
     )
 
-    return {
-        "conversation_id": conversation_id,
-        "response": res.content
-    }
-
 
 
 
 @app.get("/users/{user_id}/conversations/")
 async def get_sessions(user_id: str) -> list[SessionSummary]:
-    sessions_data = get_session_ids_by_username(user_id)
+    sessions_data = await run_in_threadpool(get_session_ids_by_username, user_id)
     return [SessionSummary(**session) for session in sessions_data]
 
 
 @app.get("/sessions/{username}/{conversation_id}/messages")
 async def get_chats(username: str, conversation_id: str) -> list[ChatEntry]:
-    chats = get_chats_by_session(conversation_id, username)
+    chats = await run_in_threadpool(get_chats_by_session, conversation_id, username)
     return [
         ChatEntry(
             user_prompt=chat.get("user_prompt", ""),
@@ -113,11 +134,11 @@ async def get_chats(username: str, conversation_id: str) -> list[ChatEntry]:
 @app.delete("/conversations/{user_id}/{conversation_id}")
 async def delete_session_endpoint(user_id: str, conversation_id: str) -> dict:
 
-    success = delete_session(conversation_id, user_id)
+    success = await run_in_threadpool(delete_session, conversation_id, user_id)
     return {"success": success}
 
 
 @app.get("/sessions/{username}/{conversation_id}/token_usage")
 async def get_token_usage(username: str, conversation_id: str) -> dict:
-    token_usage = get_session_token_usage(conversation_id, username)
+    token_usage = await run_in_threadpool(get_session_token_usage, conversation_id, username)
     return token_usage
\ No newline at end of file
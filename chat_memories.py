@@ -1,12 +1,37 @@
 import os
 from typing import Any, Dict, List, Optional
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.engine import Engine
 
 AGNO_DB_URL = os.getenv("AGNO_DB_URL", "sqlite:///tmp/agents.db")
 _ENGINE: Optional[Engine] = None
 
+# WAL lets readers run alongside the single writer; NORMAL sync is safe under WAL
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,  # 64 MB page cache
+    "busy_timeout": 5000,  # wait for the write lock instead of failing immediately
+}
+
+
+def create_db_engine(db_url: str) -> Engine:
+    """Create an engine; SQLite connections are pooled across threads and set to WAL mode"""
+    if not db_url.startswith("sqlite"):
+        return create_engine(db_url, future=True)
+
+    engine = create_engine(db_url, future=True, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+    return engine
+
 
 def _get_engine() -> Engine:
     global _ENGINE
@@ -15,7 +40,7 @@ def _get_engine() -> Engine:
         db_url = os.getenv("AGNO_DB_URL", "sqlite:///tmp/agents.db")
         
         try:
-            _ENGINE = create_engine(db_url, future=True)
+            _ENGINE = create_db_engine(db_url)
             # Test connection
             with _ENGINE.connect() as conn:
                 conn.execute(text("SELECT 1"))
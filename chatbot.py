@@ -4,16 +4,83 @@ from agno.db.sqlite import SqliteDb
 from agno.models.openai import OpenAIChat
 from agno.tools.crawl4ai import Crawl4aiTools
 from agno.tools import tool
-from rag_tool import RAGTool
+from openai import AsyncOpenAI, OpenAI
+from rag_tool import DEFAULT_EMBEDDING_MODEL, EmbeddingCache, EmbeddingDispatcher, RAGTool, pdf_cache_key
+from chat_memories import create_db_engine
 import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
 # API Key
 API_KEY = os.getenv('OPENAI_API_KEY')
+# Optional quantized RAG index: "pq" or "sq8" (unset = full precision)
+RAG_INDEX_QUANTIZATION = os.getenv('RAG_INDEX_QUANTIZATION') or None
+
+# Shared by every RAGTool so repeated embeddings hit the same SQLite file
+_embedding_cache = EmbeddingCache()
+
+
+@lru_cache(maxsize=1)
+def _openai_clients() -> Tuple[OpenAI, AsyncOpenAI, EmbeddingDispatcher]:
+    """
+    One pair of OpenAI clients (and connection pools) per process, plus the
+    query embedding dispatcher shared by every PDF, created on first use
+    """
+    # Embedding requests retry 429s in rag_tool; SDK retries would multiply them
+    async_client = AsyncOpenAI(api_key=API_KEY, max_retries=0)
+    return OpenAI(api_key=API_KEY), async_client, EmbeddingDispatcher(async_client, DEFAULT_EMBEDDING_MODEL)
+
+
+# Cache for RAG instances (so we don't reload same PDFs), keyed by
+# (content hash, model) so one file reached by different paths is shared;
+# a PDF that is no longer on disk is keyed by its filename (legacy caches).
+# Evicted entries drop their last reference, freeing the matrix and index.
+_RAG_CACHE_SIZE = 32
+_rag_cache: "OrderedDict[Tuple[str, str], RAGTool]" = OrderedDict()
+_rag_cache_lock = threading.Lock()
+# One lock per key being built, so concurrent first requests for the same PDF
+# ingest it once while other PDFs load in parallel
+_rag_build_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+
+def _get_rag(pdf_path: str) -> RAGTool:
+    key = (pdf_cache_key(pdf_path), DEFAULT_EMBEDDING_MODEL)
+    with _rag_cache_lock:
+        if key in _rag_cache:
+            _rag_cache.move_to_end(key)
+            print(f"\n✅ [RAG] Using cached version")
+            return _rag_cache[key]
+        build_lock = _rag_build_locks.setdefault(key, threading.Lock())
+    
+    with build_lock:
+        with _rag_cache_lock:
+            if key in _rag_cache:
+                _rag_cache.move_to_end(key)
+                print(f"\n✅ [RAG] Using cached version")
+                return _rag_cache[key]
+        
+        try:
+            print(f"\n🔧 [RAG] Initializing for: {pdf_path}")
+            client, async_client, dispatcher = _openai_clients()
+            rag = RAGTool(client=client, async_client=async_client, embedding_cache=_embedding_cache,
+                          index_quantization=RAG_INDEX_QUANTIZATION, dispatcher=dispatcher)
+            rag.process_pdf(pdf_path)
+            
+            with _rag_cache_lock:
+                _rag_cache[key] = rag
+                _rag_cache.move_to_end(key)
+                if len(_rag_cache) > _RAG_CACHE_SIZE:
+                    _rag_cache.popitem(last=False)
+        finally:
+            with _rag_cache_lock:
+                if _rag_build_locks.get(key) is build_lock:
+                    del _rag_build_locks[key]
+    return rag
 
-# Cache for RAG instances (so we don't reload same PDFs)
-_rag_cache = {}
 
 @tool
 def answer_from_pdf(pdf_path: str, query: str, top_k: int = 3) -> str:
@@ -29,15 +96,7 @@ def answer_from_pdf(pdf_path: str, query: str, top_k: int = 3) -> str:
     Returns:
         AI-generated answer based on PDF content
     """
-    if pdf_path not in _rag_cache:
-        print(f"\n🔧 [RAG] Initializing for: {pdf_path}")
-        rag = RAGTool(api_key=API_KEY)
-        rag.process_pdf(pdf_path)
-        _rag_cache[pdf_path] = rag
-    else:
-        print(f"\n✅ [RAG] Using cached version")
-    
-    rag = _rag_cache[pdf_path]
+    rag = _get_rag(pdf_path)
     answer = rag.answer_query(query, top_k=top_k, model="gpt-4o-mini")
     return answer
 
@@ -55,15 +114,7 @@ def search_pdf_content(pdf_path: str, query: str, top_k: int = 3) -> str:
     Returns:
         Relevant text chunks from the PDF with similarity scores
     """
-    if pdf_path not in _rag_cache:
-        print(f"\n🔧 [RAG] Initializing for: {pdf_path}")
-        rag = RAGTool(api_key=API_KEY)
-        rag.process_pdf(pdf_path)
-        _rag_cache[pdf_path] = rag
-    else:
-        print(f"\n✅ [RAG] Using cached version")
-    
-    rag = _rag_cache[pdf_path]
+    rag = _get_rag(pdf_path)
     results = rag.search(query, top_k=top_k)
     
     output = []
@@ -75,7 +126,7 @@ def search_pdf_content(pdf_path: str, query: str, top_k: int = 3) -> str:
 
 
 
-db = SqliteDb(db_file="tmp/agents.db")
+db = SqliteDb(db_engine=create_db_engine("sqlite:///tmp/agents.db"))
 
 
 agent = Agent(
@@ -1,32 +1,458 @@
-import json
+import asyncio
+import email.utils
+import hashlib
 import os
-from typing import List, Dict, Tuple
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, List, Dict, Optional, Tuple, TypeVar
 import numpy as np
-from openai import OpenAI
+import orjson
+import tiktoken
+from openai import AsyncOpenAI, OpenAI, RateLimitError
 from pypdf import PdfReader
-from sklearn.metrics.pairwise import cosine_similarity
+
+try:
+    import faiss
+except ImportError:  # faiss is optional; fall back to brute-force NumPy search
+    faiss = None
+
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Opt-in GPU search (needs faiss-gpu and a visible CUDA device), kept off by
+# default so the standard faiss-cpu install is unaffected
+RAG_USE_GPU = os.getenv("RAG_USE_GPU", "").lower() in ("1", "true", "yes")
+
+# Switch from exact to approximate (HNSW) search above this many chunks
+HNSW_THRESHOLD = 10_000
+
+# Quantized index settings: IVF lists/probes and PQ sub-quantizers (96 divides
+# d=1536 for text-embedding-3-small). PQ needs ~39 training points per
+# centroid (2^8), so smaller documents fall back to 8-bit scalar quantization.
+QUANTIZATION_TYPES = ("pq", "sq8")
+PQ_NLIST = 64
+PQ_NPROBE = 8
+PQ_SUBQUANTIZERS = 96
+PQ_MIN_TRAIN = 39 * 256
+
+# Embedding request tuning: max inputs per request for text-embedding-3-*,
+# max total tokens per request, concurrent in-flight requests, and retries
+# on 429 responses
+EMBEDDING_BATCH_SIZE = 2048
+EMBEDDING_MAX_BATCH_TOKENS = 300_000
+EMBEDDING_CONCURRENCY = 5
+EMBEDDING_MAX_RETRIES = 5
+
+T = TypeVar("T")
+
+# All async OpenAI calls run on one long-lived loop so the AsyncOpenAI
+# connection pool is never bound to a loop that has already been closed
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="rag-tool-loop", daemon=True).start()
+    return _loop
+
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """Run a coroutine on the background loop and block until it finishes"""
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop()).result()
+
+
+def _retry_delay(retry_after: Optional[str], attempt: int) -> float:
+    """Seconds to wait from a Retry-After header (seconds or HTTP date), else exponential backoff"""
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            retry_at = email.utils.parsedate_to_datetime(retry_after)
+            return max(0.0, retry_at.timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    return float(2 ** attempt)
+
+
+async def acreate_embeddings(async_client: AsyncOpenAI, model: str, batch: List[str]):
+    """
+    Single embeddings request with exponential backoff on 429s. Build the
+    client with max_retries=0 so this loop is the only retry layer.
+    """
+    for attempt in range(EMBEDDING_MAX_RETRIES):
+        try:
+            return await async_client.embeddings.create(input=batch, model=model)
+        except RateLimitError as e:
+            if attempt == EMBEDDING_MAX_RETRIES - 1:
+                raise
+            delay = _retry_delay(e.response.headers.get("retry-after"), attempt)
+            print(f"  ⏳ Rate limited, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+_gpu_resources = None
+_gpu_lock = threading.Lock()
+
+
+def _gpu_resources_or_none():
+    """Shared StandardGpuResources when GPU search is enabled and available"""
+    global _gpu_resources
+    if not RAG_USE_GPU or faiss is None or not hasattr(faiss, "StandardGpuResources"):
+        return None
+    with _gpu_lock:
+        if _gpu_resources is None and faiss.get_num_gpus() > 0:
+            _gpu_resources = faiss.StandardGpuResources()
+    return _gpu_resources
+
+
+_pdf_index_lock = threading.Lock()
+# index_path -> {abs_path: {"mtime", "size", "hash"}}, read from disk once
+_pdf_indexes: Dict[str, Dict[str, dict]] = {}
+
+
+def _pdf_index(index_path: str) -> Dict[str, dict]:
+    """In-memory copy of a pdf_index.json; caller must hold _pdf_index_lock"""
+    if index_path not in _pdf_indexes:
+        index = {}
+        if os.path.exists(index_path):
+            with open(index_path, 'rb') as f:
+                index = orjson.loads(f.read())
+        _pdf_indexes[index_path] = index
+    return _pdf_indexes[index_path]
+
+
+def pdf_fingerprint(pdf_path: str, embeddings_dir: str = "tmp/embeddings") -> str:
+    """
+    Content hash of a PDF (first 16 hex chars of its sha256), so the same
+    file reached through different paths shares one embeddings cache.
+    Results are remembered per path in embeddings_dir/pdf_index.json and
+    reused while the file's mtime and size are unchanged.
+    
+    Args:
+        pdf_path: Path to PDF file
+        embeddings_dir: Directory holding the path -> hash index
+        
+    Returns:
+        16-character hex digest of the file contents
+    """
+    abs_path = os.path.abspath(pdf_path)
+    stat = os.stat(abs_path)
+    index_path = os.path.join(embeddings_dir, "pdf_index.json")
+    
+    with _pdf_index_lock:
+        entry = _pdf_index(index_path).get(abs_path)
+    if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+        return entry["hash"]
+    
+    # Hash outside the lock so a large PDF doesn't stall lookups of others
+    digest = hashlib.sha256()
+    with open(abs_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    file_hash = digest.hexdigest()[:16]
+    
+    with _pdf_index_lock:
+        index = _pdf_index(index_path)
+        index[abs_path] = {"mtime": stat.st_mtime, "size": stat.st_size, "hash": file_hash}
+        os.makedirs(embeddings_dir, exist_ok=True)
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(index))
+        os.replace(tmp_path, index_path)
+    
+    return file_hash
+
+
+def pdf_cache_key(pdf_path: str, embeddings_dir: str = "tmp/embeddings") -> str:
+    """
+    Cache key for a PDF: its content fingerprint while the file exists,
+    else its filename stem, which is how legacy caches were named. A
+    filename can belong to different bytes, so it is only trusted once
+    the PDF is gone.
+    """
+    if os.path.exists(pdf_path):
+        return pdf_fingerprint(pdf_path, embeddings_dir)
+    return os.path.splitext(os.path.basename(pdf_path))[0]
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first, in O(N + k log k)
+    
+    Args:
+        scores: 1-D array of similarity scores
+        k: Number of indices to return (clamped to len(scores))
+        
+    Returns:
+        Array of indices sorted by descending score
+    """
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < scores.shape[0]:
+        # Partial sort: O(N) partition, then order only the k winners
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.shape[0])
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by sha256(model + NUL + text)
+    - Stores float32 vectors as BLOBs in SQLite
+    - Keeps an in-process LRU in front for hot queries
+    """
+    
+    # Stay under SQLite's host-parameter limit on older builds
+    _LOOKUP_BATCH = 500
+    
+    def __init__(self, db_path: str = "tmp/embed_cache.sqlite", memory_size: int = 1024):
+        """
+        Initialize Embedding Cache
+        
+        Args:
+            db_path: Path to the SQLite cache file
+            memory_size: Max number of vectors kept in the in-process LRU
+        """
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (hash TEXT PRIMARY KEY, model TEXT, vec BLOB)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._memory_size = memory_size
+    
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256((model + "\x00" + text).encode()).hexdigest()
+    
+    def _remember(self, key: str, vec: np.ndarray):
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        if len(self._memory) > self._memory_size:
+            self._memory.popitem(last=False)
+    
+    def get_many(self, model: str, texts: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up cached embeddings
+        
+        Args:
+            model: Embedding model name
+            texts: Texts to look up
+            
+        Returns:
+            Mapping of text -> float32 vector for cache hits only
+        """
+        keys = {self.key(model, text): text for text in texts}
+        found: Dict[str, np.ndarray] = {}
+        
+        with self._lock:
+            missing = []
+            for key, text in keys.items():
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[text] = self._memory[key]
+                else:
+                    missing.append(key)
+            
+            for i in range(0, len(missing), self._LOOKUP_BATCH):
+                batch = missing[i:i + self._LOOKUP_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT hash, vec FROM embeddings WHERE hash IN ({','.join('?' * len(batch))})",
+                    batch
+                )
+                for key, blob in rows:
+                    vec = np.frombuffer(blob, dtype=np.float32)
+                    self._remember(key, vec)
+                    found[keys[key]] = vec
+        
+        return found
+    
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """
+        Store embeddings in the cache
+        
+        Args:
+            model: Embedding model name
+            texts: Texts that were embedded
+            vectors: Embeddings, in the same order as texts
+        """
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.key(model, text)
+                # Copy, so a remembered row doesn't keep a whole batch matrix alive
+                vec = np.array(vector, dtype=np.float32)
+                self._remember(key, vec)
+                rows.append((key, model, vec.tobytes()))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (hash, model, vec) VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+
+class EmbeddingDispatcher:
+    """
+    Micro-batching dispatcher for query embeddings
+    - Callers await embed(text) concurrently
+    - A background task coalesces queued texts into batches, flushing at
+      max_batch items or max_wait seconds after the first
+    - Each batch is sent as its own request, up to max_concurrency at once,
+      while the next batch is being collected
+    """
+    
+    def __init__(self, async_client: AsyncOpenAI, embedding_model: str,
+                 max_batch: int = 64, max_wait: float = 0.005,
+                 max_concurrency: int = EMBEDDING_CONCURRENCY):
+        """
+        Initialize Embedding Dispatcher
+        
+        Args:
+            async_client: AsyncOpenAI client used for the batched requests
+            embedding_model: OpenAI embedding model to use
+            max_batch: Max number of texts per request
+            max_wait: Max seconds to wait for more texts after the first arrives
+            max_concurrency: Max number of batch requests in flight
+        """
+        self.async_client = async_client
+        self.embedding_model = embedding_model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_concurrency = max_concurrency
+        # Created on first use so they bind to the loop that runs them
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # Strong references, so in-flight batch tasks aren't garbage collected
+        self._batches: set = set()
+    
+    async def embed(self, text: str) -> np.ndarray:
+        """
+        Embed one text as part of the next batch
+        
+        Args:
+            text: Text to embed
+            
+        Returns:
+            float32 embedding (not normalized)
+        """
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+    
+    async def _collect(self) -> List[Tuple[str, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        items = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(items) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return items
+    
+    async def _run(self):
+        while True:
+            items = await self._collect()
+            # Wait for a free slot; texts queue up meanwhile and form the next batch
+            await self._semaphore.acquire()
+            task = asyncio.create_task(self._send(items))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+    
+    async def _send(self, items: List[Tuple[str, asyncio.Future]]):
+        try:
+            response = await acreate_embeddings(
+                self.async_client, self.embedding_model, [text for text, _ in items]
+            )
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._semaphore.release()
+        
+        # Response data is in input order, so index i answers items[i]
+        for (_, future), item in zip(items, response.data):
+            if not future.done():
+                future.set_result(np.asarray(item.embedding, dtype=np.float32))
+
 
 class RAGTool:
     """
     RAG Tool for PDF processing with embedding caching
     - Loads PDF and creates embeddings
-    - Saves/loads embeddings from JSON
+    - Saves/loads embeddings as float16 .npz (plus a FAISS index when available)
     - Provides semantic search for queries
     """
     
-    def __init__(self, api_key: str, embedding_model: str = "text-embedding-3-small"):
+    def __init__(self, api_key: Optional[str] = None, embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+                 embedding_cache: Optional[EmbeddingCache] = None,
+                 client: Optional[OpenAI] = None, async_client: Optional[AsyncOpenAI] = None,
+                 index_quantization: Optional[str] = None,
+                 dispatcher: Optional[EmbeddingDispatcher] = None):
         """
         Initialize RAG Tool
         
         Args:
-            api_key: OpenAI API key
+            api_key: OpenAI API key (only used when clients are not provided)
             embedding_model: OpenAI embedding model to use
+            embedding_cache: Cache for chunk/query embeddings (default: tmp/embed_cache.sqlite)
+            client: Shared OpenAI client, to reuse its connection pool across instances
+            async_client: Shared AsyncOpenAI client used for batched embedding requests
+                (ideally with max_retries=0; rate limits are retried here)
+            index_quantization: None for full-precision search, "pq" for IVF-PQ or
+                "sq8" for 8-bit scalar quantization (requires faiss)
+            dispatcher: Shared micro-batching dispatcher for query embeddings (must use embedding_model)
         """
-        self.client = OpenAI(api_key=api_key)
+        if index_quantization not in (None, *QUANTIZATION_TYPES):
+            raise ValueError(f"index_quantization must be one of {QUANTIZATION_TYPES} or None")
+        
+        self.client = client or OpenAI(api_key=api_key)
+        # acreate_embeddings retries 429s itself, so the SDK's retries are disabled
+        self.async_client = async_client or AsyncOpenAI(api_key=api_key, max_retries=0)
         self.embedding_model = embedding_model
+        self.index_quantization = index_quantization
+        self.embedding_cache = embedding_cache or EmbeddingCache()
+        if dispatcher is not None and dispatcher.embedding_model != embedding_model:
+            raise ValueError(
+                f"dispatcher embeds with {dispatcher.embedding_model}, not {embedding_model}"
+            )
+        self.dispatcher = dispatcher or EmbeddingDispatcher(self.async_client, embedding_model)
         self.chunks = []
-        self.embeddings = []
-        
+        # Embeddings are kept only as this normalized float32 matrix (plus the index)
+        self.embeddings_matrix = None
+        self.index = None
+        self.index_on_gpu = False
+        self._encoding = None
+        
+    def get_encoding(self) -> tiktoken.Encoding:
+        """Tokenizer matching the embedding model (loaded on first use)"""
+        if self._encoding is None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(self.embedding_model)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+        return self._encoding
+    
     def load_pdf(self, pdf_path: str) -> str:
         """
         Load and extract text from PDF
@@ -40,99 +466,266 @@ class RAGTool:
         
         print(f"📄 Loading PDF: {pdf_path}")
         reader = PdfReader(pdf_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
+        # Collect pages and join once instead of growing a string per page
+        text = "".join(f"{page.extract_text() or ''}\n" for page in reader.pages)
         print(f"✅ Loaded {len(reader.pages)} pages")
         return text
     
-    def chunk_text(self, text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
+    def chunk_text(self, text: str, chunk_size: int = 800, overlap: int = 80) -> List[str]:
         """
-        Split text into overlapping chunks
+        Split text into overlapping token-based chunks, snapping chunk ends
+        back to a paragraph break when one falls near the end of the window
         
         Args:
             text: Text to chunk
-            chunk_size: Size of each chunk in characters
-            overlap: Overlap between chunks
+            chunk_size: Size of each chunk in tokens
+            overlap: Overlap between chunks in tokens
             
         Returns:
             List of text chunks
         """
-        print(f"✂️  Chunking text (chunk_size={chunk_size}, overlap={overlap})")
+        return self._chunk_tokens(text, chunk_size, overlap)[0]
+    
+    def _chunk_tokens(self, text: str, chunk_size: int, overlap: int) -> Tuple[List[str], List[int]]:
+        """chunk_text, plus each chunk's token count so batching needn't re-tokenize"""
+        print(f"✂️  Chunking text (chunk_size={chunk_size}, overlap={overlap} tokens)")
+        encoding = self.get_encoding()
+        tokens = encoding.encode(text)
+        snap_window = chunk_size // 10
         chunks = []
+        token_counts = []
         start = 0
         
-        while start < len(text):
-            end = start + chunk_size
-            chunk = text[start:end]
+        while start < len(tokens):
+            end = min(start + chunk_size, len(tokens))
+            
+            # Look back a few tokens for a paragraph break, but always advance past the overlap
+            if end < len(tokens):
+                for i in range(end - 1, max(end - snap_window, start + overlap), -1):
+                    if b"\n\n" in encoding.decode_single_token_bytes(tokens[i]):
+                        end = i + 1
+                        break
             
-            # Only add non-empty chunks
-            if chunk.strip():
-                chunks.append(chunk.strip())
+            # A window can cut a multi-byte character; drop the fragments at its
+            # edges instead of storing U+FFFD (the overlap keeps the whole character)
+            chunk = encoding.decode_bytes(tokens[start:end]).decode("utf-8", errors="ignore").strip()
+            # Only keep non-empty chunks
+            if chunk:
+                chunks.append(chunk)
+                token_counts.append(end - start)
             
-            start += chunk_size - overlap
+            if end == len(tokens):
+                break
+            start = end - overlap
         
         print(f"✅ Created {len(chunks)} chunks")
-        return chunks
+        return chunks, token_counts
     
-    def create_embeddings(self, texts: List[str]) -> List[List[float]]:
+    def create_embeddings(self, texts: List[str],
+                          token_counts: Optional[List[int]] = None) -> np.ndarray:
         """
         Create embeddings for text chunks
         
         Args:
             texts: List of text chunks
+            token_counts: Token count of each text, if already known
             
         Returns:
-            List of embeddings
+            (len(texts), D) float32 matrix of embeddings (not normalized)
         """
         print(f"🔄 Creating embeddings for {len(texts)} chunks...")
-        embeddings = []
-        
-        # Process in batches to avoid rate limits
-        batch_size = 100
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            response = self.client.embeddings.create(
-                input=batch,
-                model=self.embedding_model
-            )
-            batch_embeddings = [item.embedding for item in response.data]
-            embeddings.extend(batch_embeddings)
-            print(f"  Processed {min(i + batch_size, len(texts))}/{len(texts)} chunks")
+        cached = self.embedding_cache.get_many(self.embedding_model, texts)
+        misses = list(dict.fromkeys(text for text in texts if text not in cached))
+        print(f"  {len(cached)} cached, {len(misses)} to embed")
+        
+        if misses:
+            miss_counts = None
+            if token_counts is not None:
+                counts = dict(zip(texts, token_counts))
+                miss_counts = [counts[text] for text in misses]
+            new_embeddings = np.asarray(run_sync(self.aembed_batch(misses, token_counts=miss_counts)),
+                                        dtype=np.float32)
+            self.embedding_cache.put_many(self.embedding_model, misses, new_embeddings)
+            cached.update(zip(misses, new_embeddings))
         
         print("✅ Embeddings created")
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([cached[text] for text in texts])
+    
+    def _batch_ranges(self, texts: List[str], batch_size: int,
+                      token_counts: Optional[List[int]] = None) -> List[Tuple[int, int]]:
+        """Split texts into (start, end) ranges within both the input and token limits"""
+        if token_counts is None:
+            encoding = self.get_encoding()
+            token_counts = [len(encoding.encode(text)) for text in texts]
+        ranges = []
+        start = 0
+        tokens = 0
+        for i, text_tokens in enumerate(token_counts):
+            if i > start and (i - start == batch_size or tokens + text_tokens > EMBEDDING_MAX_BATCH_TOKENS):
+                ranges.append((start, i))
+                start, tokens = i, 0
+            tokens += text_tokens
+        if start < len(texts):
+            ranges.append((start, len(texts)))
+        return ranges
+    
+    async def aembed_batch(self, texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE,
+                           token_counts: Optional[List[int]] = None) -> List[List[float]]:
+        """
+        Embed texts with concurrent batched requests, preserving input order
+        
+        Args:
+            texts: Texts to embed
+            batch_size: Max number of texts sent per embeddings request
+            token_counts: Token count of each text, if already known
+            
+        Returns:
+            List of embeddings, in the same order as texts
+        """
+        embeddings: List[List[float]] = [None] * len(texts)
+        semaphore = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+        done = 0
+        
+        async def embed(start: int, end: int):
+            nonlocal done
+            batch = texts[start:end]
+            async with semaphore:
+                response = await self._acreate_embeddings(batch)
+            embeddings[start:end] = [item.embedding for item in response.data]
+            done += len(batch)
+            print(f"  Processed {done}/{len(texts)} chunks")
+        
+        ranges = self._batch_ranges(texts, batch_size, token_counts)
+        await asyncio.gather(*(embed(start, end) for start, end in ranges))
         return embeddings
     
+    async def _acreate_embeddings(self, batch: List[str]):
+        """Single embeddings request with exponential backoff on 429s"""
+        return await acreate_embeddings(self.async_client, self.embedding_model, batch)
+    
+    def build_embeddings_matrix(self, embeddings):
+        """
+        Build a contiguous, L2-normalized float32 matrix from embeddings
+        so search is a single matrix-vector product. Left as None when there
+        are no chunks (e.g. a scanned PDF with no extractable text).
+        
+        Args:
+            embeddings: (N, D) array or nested list; a float32 array is
+                normalized in place rather than copied
+        """
+        if len(embeddings) == 0:
+            self.embeddings_matrix = None
+            return
+        
+        # Chunk vectors are static between ingests, so normalize once here and
+        # only the 1-D query vector at search time (zero rows are left as zeros)
+        self.embeddings_matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(self.embeddings_matrix, axis=1, keepdims=True)
+        self.embeddings_matrix /= np.where(norms == 0, 1, norms)
+    
+    def build_index(self):
+        """
+        Build a FAISS inner-product index over the normalized embedding matrix.
+        Uses exact IndexFlatIP for small documents and IndexHNSWFlat once the
+        number of chunks exceeds HNSW_THRESHOLD, unless index_quantization
+        selects a quantized index. No-op if faiss is not installed.
+        """
+        if faiss is None or self.embeddings_matrix is None:
+            self.index = None
+            return
+        
+        n, d = self.embeddings_matrix.shape
+        if self.index_quantization == "pq" and n >= PQ_MIN_TRAIN and d % PQ_SUBQUANTIZERS == 0:
+            quantizer = faiss.IndexFlatIP(d)
+            self.index = faiss.IndexIVFPQ(quantizer, d, PQ_NLIST, PQ_SUBQUANTIZERS, 8,
+                                          faiss.METRIC_INNER_PRODUCT)
+            self.index.train(self.embeddings_matrix)
+            self.index.nprobe = PQ_NPROBE
+        elif self.index_quantization is not None:
+            self.index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_8bit,
+                                                    faiss.METRIC_INNER_PRODUCT)
+            self.index.train(self.embeddings_matrix)
+        elif n > HNSW_THRESHOLD:
+            self.index = faiss.IndexHNSWFlat(d, 32, faiss.METRIC_INNER_PRODUCT)
+            self.index.hnsw.efConstruction = 200
+            self.index.hnsw.efSearch = 64
+        else:
+            self.index = faiss.IndexFlatIP(d)
+        self.index.add(self.embeddings_matrix)
+        self._move_index_to_gpu()
+    
+    def _move_index_to_gpu(self):
+        """Copy the index to GPU 0 when RAG_USE_GPU is set; keep CPU on failure"""
+        self.index_on_gpu = False
+        resources = _gpu_resources_or_none()
+        if resources is None:
+            return
+        try:
+            self.index = faiss.index_cpu_to_gpu(resources, 0, self.index)
+            self.index_on_gpu = True
+        except RuntimeError as e:
+            # e.g. HNSW has no GPU implementation
+            print(f"⚠️  GPU index unavailable, searching on CPU: {e}")
+    
+    def _cache_name(self, pdf_path: str, embeddings_dir: str) -> str:
+        """Cache file stem keyed by (content hash, embedding model), or the legacy name once the PDF is gone"""
+        if os.path.exists(pdf_path):
+            return f"{pdf_fingerprint(pdf_path, embeddings_dir)}_{self.embedding_model}"
+        return pdf_cache_key(pdf_path, embeddings_dir)
+    
+    def _index_ext(self) -> str:
+        """Index file extension; includes the quantization mode so changing it rebuilds the index"""
+        return f"{self.index_quantization or 'full'}.faiss"
+    
+    def _cache_path(self, cache_name: str, embeddings_dir: str, ext: str) -> str:
+        return os.path.join(embeddings_dir, f"{cache_name}_embeddings.{ext}")
+    
     def save_embeddings(self, pdf_path: str, embeddings_dir: str = "tmp/embeddings"):
         """
-        Save chunks and embeddings to JSON
+        Save chunks and float16 embeddings to .npz, with a small JSON metadata sidecar
         
         Args:
-            pdf_path: Original PDF path (used for naming)
+            pdf_path: Original PDF path (its content hash is used for naming)
             embeddings_dir: Directory to save embeddings
         """
         os.makedirs(embeddings_dir, exist_ok=True)
         
-        # Create filename based on PDF name
-        pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
-        json_path = os.path.join(embeddings_dir, f"{pdf_name}_embeddings.json")
+        cache_name = self._cache_name(pdf_path, embeddings_dir)
+        json_path = self._cache_path(cache_name, embeddings_dir, "json")
+        npz_path = self._cache_path(cache_name, embeddings_dir, "npz")
+        
+        # float16 halves the file again vs float32; cosine ranking is robust to it
+        np.savez_compressed(
+            npz_path,
+            chunks=np.array(self.chunks, dtype=str),
+            # Rows are already normalized; loading normalizes again, a no-op for them
+            embeddings=(self.embeddings_matrix if self.embeddings_matrix is not None
+                        else np.empty((0, 0))).astype(np.float16)
+        )
         
-        data = {
+        metadata = {
             "pdf_path": pdf_path,
-            "chunks": self.chunks,
-            "embeddings": self.embeddings,
-            "model": self.embedding_model
+            "model": self.embedding_model,
+            "num_chunks": len(self.chunks)
         }
+        with open(json_path, 'wb') as f:
+            f.write(orjson.dumps(metadata))
         
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        self._save_index(cache_name, embeddings_dir)
         
-        print(f"💾 Embeddings saved to: {json_path}")
-        return json_path
+        print(f"💾 Embeddings saved to: {npz_path}")
+        return npz_path
+    
+    def _save_index(self, cache_name: str, embeddings_dir: str):
+        if self.index is not None:
+            cpu_index = faiss.index_gpu_to_cpu(self.index) if self.index_on_gpu else self.index
+            faiss.write_index(cpu_index, self._cache_path(cache_name, embeddings_dir, self._index_ext()))
     
     def load_embeddings(self, pdf_path: str, embeddings_dir: str = "tmp/embeddings") -> bool:
         """
-        Load embeddings from JSON if exists
+        Load embeddings from cache if exists
         
         Args:
             pdf_path: Original PDF path
@@ -141,33 +734,66 @@ class RAGTool:
         Returns:
             True if loaded successfully, False otherwise
         """
-        pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
-        json_path = os.path.join(embeddings_dir, f"{pdf_name}_embeddings.json")
+        if self._load_cache_files(self._cache_name(pdf_path, embeddings_dir), embeddings_dir):
+            print(f"✅ Loaded {len(self.chunks)} chunks from cache")
+            return True
+        
+        print(f"❌ No cached embeddings found for {os.path.basename(pdf_path)}")
+        return False
+    
+    def _load_cache_files(self, cache_name: str, embeddings_dir: str) -> bool:
+        json_path = self._cache_path(cache_name, embeddings_dir, "json")
+        npz_path = self._cache_path(cache_name, embeddings_dir, "npz")
         
         if not os.path.exists(json_path):
-            print(f"❌ No cached embeddings found for {pdf_name}")
             return False
         
-        print(f"📂 Loading cached embeddings from: {json_path}")
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # orjson also makes parsing legacy caches with inline embeddings much faster
+        with open(json_path, 'rb') as f:
+            data = orjson.loads(f.read())
+        
+        if data.get("model") != self.embedding_model:
+            print(f"⚠️  Ignoring {json_path}: built with {data.get('model')}, not {self.embedding_model}")
+            return False
+        
+        if "embeddings" in data:
+            # Legacy cache: chunks and embeddings inline in the JSON file
+            print(f"📂 Loading cached embeddings from: {json_path}")
+            self.chunks = data["chunks"]
+            embeddings = data["embeddings"]
+        elif os.path.exists(npz_path):
+            print(f"📂 Loading cached embeddings from: {npz_path}")
+            with np.load(npz_path) as cache:
+                self.chunks = cache["chunks"].tolist()
+                embeddings = cache["embeddings"]
+        else:
+            return False
+        
+        self.build_embeddings_matrix(embeddings)
         
-        self.chunks = data["chunks"]
-        self.embeddings = data["embeddings"]
+        index_path = self._cache_path(cache_name, embeddings_dir, self._index_ext())
+        if faiss is not None and os.path.exists(index_path):
+            self.index = faiss.read_index(index_path)
+            if self.index.ntotal == len(self.chunks):
+                self._move_index_to_gpu()
+                return True
+        
+        # No index saved for this quantization mode yet (or it is stale)
+        self.build_index()
+        self._save_index(cache_name, embeddings_dir)
         
-        print(f"✅ Loaded {len(self.chunks)} chunks from cache")
         return True
     
     def process_pdf(self, pdf_path: str, force_recreate: bool = False, 
-                    chunk_size: int = 500, overlap: int = 50):
+                    chunk_size: int = 800, overlap: int = 80):
         """
         Process PDF: Load from cache or create new embeddings
         
         Args:
             pdf_path: Path to PDF file
             force_recreate: Force recreation of embeddings even if cached
-            chunk_size: Size of each chunk
-            overlap: Overlap between chunks
+            chunk_size: Size of each chunk in tokens
+            overlap: Overlap between chunks in tokens
         """
         # Try to load from cache first
         if not force_recreate and self.load_embeddings(pdf_path):
@@ -177,15 +803,16 @@ class RAGTool:
         text = self.load_pdf(pdf_path)
         
         # Chunk the text
-        self.chunks = self.chunk_text(text, chunk_size, overlap)
+        self.chunks, token_counts = self._chunk_tokens(text, chunk_size, overlap)
         
         # Create embeddings
-        self.embeddings = self.create_embeddings(self.chunks)
+        self.build_embeddings_matrix(self.create_embeddings(self.chunks, token_counts))
+        self.build_index()
         
         # Save to cache
         self.save_embeddings(pdf_path)
     
-    def get_query_embedding(self, query: str) -> List[float]:
+    def get_query_embedding(self, query: str) -> np.ndarray:
         """
         Create embedding for query
         
@@ -193,13 +820,55 @@ class RAGTool:
             query: Query text
             
         Returns:
-            Query embedding
+            L2-normalized float32 query embedding
         """
-        response = self.client.embeddings.create(
-            input=[query],
-            model=self.embedding_model
-        )
-        return response.data[0].embedding
+        cached = self.embedding_cache.get_many(self.embedding_model, [query])
+        if query in cached:
+            query_vec = cached[query]
+        else:
+            # Concurrent queries are coalesced into one embeddings request
+            query_vec = run_sync(self.dispatcher.embed(query))
+            self.embedding_cache.put_many(self.embedding_model, [query], [query_vec])
+        return query_vec / (np.linalg.norm(query_vec) or 1.0)
+    
+    def get_query_embeddings(self, queries: List[str]) -> np.ndarray:
+        """
+        Create embeddings for many queries in one batched pass
+        
+        Args:
+            queries: Query texts
+            
+        Returns:
+            (len(queries), D) matrix of L2-normalized float32 query embeddings
+        """
+        cached = self.embedding_cache.get_many(self.embedding_model, queries)
+        misses = list(dict.fromkeys(query for query in queries if query not in cached))
+        if misses:
+            new_embeddings = run_sync(self.aembed_batch(misses))
+            self.embedding_cache.put_many(self.embedding_model, misses, new_embeddings)
+            cached.update(zip(misses, new_embeddings))
+        
+        query_matrix = np.array([cached[query] for query in queries], dtype=np.float32)
+        norms = np.linalg.norm(query_matrix, axis=1, keepdims=True)
+        return query_matrix / np.where(norms == 0, 1, norms)
+    
+    def _search_vectors(self, query_matrix: np.ndarray, top_k: int) -> List[List[Tuple[str, float]]]:
+        """Top-k (chunk, score) lists for each row of a normalized (Q, D) query matrix"""
+        k = min(top_k, len(self.chunks))
+        
+        if k <= 0:
+            return [[] for _ in range(query_matrix.shape[0])]
+        
+        if self.index is not None:
+            # Inner product over normalized vectors == cosine similarity
+            scores, indices = self.index.search(query_matrix, k)
+            return [[(self.chunks[i], float(score)) for i, score in zip(row_indices, row_scores) if i != -1]
+                    for row_indices, row_scores in zip(indices, scores)]
+        
+        # Cosine similarity: both sides are pre-normalized, so a dot product suffices
+        similarities = query_matrix @ self.embeddings_matrix.T
+        return [[(self.chunks[i], float(row[i])) for i in top_k_indices(row, k)]
+                for row in similarities]
     
     def search(self, query: str, top_k: int = 3) -> List[Tuple[str, float]]:
         """
@@ -212,24 +881,37 @@ class RAGTool:
         Returns:
             List of (chunk, similarity_score) tuples
         """
-        if not self.chunks or not self.embeddings:
+        if not self.chunks or self.embeddings_matrix is None:
             raise ValueError("No embeddings loaded. Please process a PDF first.")
         
         print(f"🔍 Searching for: '{query}'")
         
         # Get query embedding
         query_embedding = self.get_query_embedding(query)
+        results = self._search_vectors(query_embedding.reshape(1, -1), top_k)[0]
         
-        # Calculate similarities
-        query_vec = np.array(query_embedding).reshape(1, -1)
-        embeddings_matrix = np.array(self.embeddings)
-        similarities = cosine_similarity(query_vec, embeddings_matrix)[0]
+        print(f"✅ Found {len(results)} relevant chunks")
+        return results
+    
+    def search_batch(self, queries: List[str], top_k: int = 3) -> List[List[Tuple[str, float]]]:
+        """
+        Search for many queries at once (a single (Q, D) search, on GPU when enabled)
         
-        # Get top k results
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
-        results = [(self.chunks[i], float(similarities[i])) for i in top_indices]
+        Args:
+            queries: Search queries
+            top_k: Number of top results to return per query
+            
+        Returns:
+            One list of (chunk, similarity_score) tuples per query
+        """
+        if not self.chunks or self.embeddings_matrix is None:
+            raise ValueError("No embeddings loaded. Please process a PDF first.")
+        if not queries:
+            return []
         
-        print(f"✅ Found {len(results)} relevant chunks")
+        print(f"🔍 Searching for {len(queries)} queries")
+        results = self._search_vectors(self.get_query_embeddings(queries), top_k)
+        print(f"✅ Found results for {len(results)} queries")
         return results
     
     def answer_query(self, query: str, top_k: int = 3, model: str = "gpt-4o-mini") -> str:
@@ -1,25 +1,48 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from agno.run.agent import RunContentEvent
 from fastapi.testclient import TestClient
 from api_For_bot import app
 
 client = TestClient(app)
 
-def test_create_conversation():
+def _read_events(response):
+    return [
+        json.loads(line[len("data: "):])
+        for line in response.text.splitlines()
+        if line.startswith("data: ")
+    ]
+
+@pytest.fixture
+def stub_agent():
+    # Stream canned tokens instead of calling OpenAI
+    with patch("chatbot.agent.run") as run:
+        run.side_effect = lambda *args, **kwargs: iter(
+            [RunContentEvent(content="Hello"), RunContentEvent(content=" there")]
+        )
+        yield run
+
+def test_create_conversation(stub_agent):
     response = client.post(
         "/conversations",
         json={"username": "test_user", "prompt": "Hello"}
     )
     assert response.status_code == 200
-    data = response.json()
-    assert "conversation_id" in data
-    assert "response" in data
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _read_events(response)
+    assert "conversation_id" in events[0]
+    assert events[1:] == [{"token": "Hello"}, {"token": " there"}]
+    assert stub_agent.call_args.kwargs["session_id"] == events[0]["conversation_id"]
 
-def test_continue_conversation():
+def test_continue_conversation(stub_agent):
     # First create conversation
     create = client.post(
         "/conversations",
         json={"username": "test_user", "prompt": "Hello"}
     )
-    conv_id = create.json()["conversation_id"]
+    conv_id = _read_events(create)[0]["conversation_id"]
 
     # Send follow-up
     response = client.post(
@@ -27,7 +50,10 @@ def test_continue_conversation():
         json={"username": "test_user", "prompt": "Tell me more"}
     )
     assert response.status_code == 200
-    assert "response" in response.json()
+    events = _read_events(response)
+    assert events[0] == {"conversation_id": conv_id}
+    assert any("token" in event for event in events[1:])
+    assert stub_agent.call_args.kwargs["session_id"] == conv_id
 
 def test_list_conversations():
     response = client.get("/users/test_user/conversations")
@@ -0,0 +1,22 @@
+from collections import OrderedDict
+
+import orjson
+import chatbot
+
+def test_get_rag_serves_legacy_cache_without_pdf(tmp_path, monkeypatch):
+    # _get_rag reads tmp/embeddings relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    embeddings_dir = tmp_path / "tmp" / "embeddings"
+    embeddings_dir.mkdir(parents=True)
+    (embeddings_dir / "resume_embeddings.json").write_bytes(orjson.dumps({
+        "pdf_path": "C:\\Users\\someone\\resume.pdf",
+        "chunks": ["first chunk", "second chunk"],
+        "embeddings": [[1.0, 0.0], [0.0, 1.0]],
+        "model": chatbot.DEFAULT_EMBEDDING_MODEL,
+    }))
+    monkeypatch.setattr(chatbot, "_rag_cache", OrderedDict())
+    monkeypatch.setattr(chatbot, "_openai_clients", lambda: (object(), object(), None))
+
+    rag = chatbot._get_rag(str(tmp_path / "gone" / "resume.pdf"))
+    assert rag.chunks == ["first chunk", "second chunk"]
+    assert chatbot._get_rag("/elsewhere/resume.pdf") is rag
@@ -0,0 +1,287 @@
+import asyncio
+import os
+import re
+from types import SimpleNamespace
+
+import numpy as np
+import orjson
+import pytest
+import rag_tool
+from rag_tool import EmbeddingCache, EmbeddingDispatcher, RAGTool, pdf_fingerprint, top_k_indices
+
+MODEL = "text-embedding-3-small"
+
+class FakeEncoding:
+    """Offline stand-in for tiktoken: one token per word (with its leading space) or blank line"""
+
+    def __init__(self):
+        self.vocab = []
+        self.ids = {}
+
+    def encode(self, text):
+        tokens = []
+        for piece in re.findall(r"\n\n|\s?\S+|\s", text):
+            if piece not in self.ids:
+                self.ids[piece] = len(self.vocab)
+                self.vocab.append(piece)
+            tokens.append(self.ids[piece])
+        return tokens
+
+    def decode(self, tokens):
+        return "".join(self.vocab[t] for t in tokens)
+
+    def decode_single_token_bytes(self, token):
+        return self.vocab[token].encode()
+
+    def decode_bytes(self, tokens):
+        return self.decode(tokens).encode()
+
+class FakeEmbeddings:
+    """Stands in for AsyncOpenAI.embeddings; each vector is [len(text), 1.0]"""
+
+    def __init__(self):
+        self.inputs = []
+
+    async def create(self, input, model):
+        self.inputs.append(list(input))
+        return SimpleNamespace(
+            data=[SimpleNamespace(embedding=[float(len(text)), 1.0]) for text in input]
+        )
+
+@pytest.fixture
+def cache(tmp_path):
+    return EmbeddingCache(db_path=str(tmp_path / "embed_cache.sqlite"), memory_size=2)
+
+@pytest.fixture
+def rag(cache):
+    tool = RAGTool(client=object(), async_client=SimpleNamespace(embeddings=FakeEmbeddings()),
+                   embedding_cache=cache)
+    tool._encoding = FakeEncoding()
+    return tool
+
+def test_cache_hits_and_misses(cache):
+    cache.put_many(MODEL, ["a", "bb"], [np.array([1.0, 2.0]), np.array([3.0, 4.0])])
+    found = cache.get_many(MODEL, ["a", "bb", "ccc"])
+    assert set(found) == {"a", "bb"}
+    assert found["bb"].dtype == np.float32
+    np.testing.assert_array_equal(found["bb"], [3.0, 4.0])
+    # Keys include the model, so another model misses
+    assert cache.get_many("other-model", ["a"]) == {}
+
+def test_cache_survives_lru_eviction(cache, tmp_path):
+    cache.put_many(MODEL, ["a", "b", "c"], [np.ones(2), np.ones(2) * 2, np.ones(2) * 3])
+    # memory_size=2 pushed "a" out of the LRU; it must come back from SQLite
+    np.testing.assert_array_equal(cache.get_many(MODEL, ["a"])["a"], [1.0, 1.0])
+    reopened = EmbeddingCache(db_path=str(tmp_path / "embed_cache.sqlite"))
+    assert set(reopened.get_many(MODEL, ["a", "b", "c"])) == {"a", "b", "c"}
+
+def test_create_embeddings_dedups_and_reuses_cache(rag):
+    fake = rag.async_client.embeddings
+    embeddings = rag.create_embeddings(["x", "yy", "x"])
+    assert embeddings.dtype == np.float32
+    assert embeddings.tolist() == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert fake.inputs == [["x", "yy"]]
+
+    # Second call only sends the text it hasn't seen
+    assert rag.create_embeddings(["yy", "zzz"]).tolist() == [[2.0, 1.0], [3.0, 1.0]]
+    assert fake.inputs == [["x", "yy"], ["zzz"]]
+
+def _words(n, start=0):
+    return " ".join(f"w{i}" for i in range(start, start + n))
+
+def test_chunk_sizes_and_overlap(rag):
+    chunks = rag.chunk_text(_words(30), chunk_size=10, overlap=2)
+    assert [len(chunk.split()) for chunk in chunks] == [10, 10, 10, 6]
+    for prev, nxt in zip(chunks, chunks[1:]):
+        assert prev.split()[-2:] == nxt.split()[:2]
+    assert chunks[-1].split()[-1] == "w29"
+
+def test_chunk_snaps_to_paragraph_break(rag):
+    # The break is the 48th token, within the last chunk_size // 10 tokens of the window
+    text = _words(47) + "\n\n" + _words(20, start=47)
+    first, second = rag.chunk_text(text, chunk_size=50, overlap=5)[:2]
+    assert first.split()[-1] == "w46"
+    assert second.split()[0] == "w43"
+
+def test_chunk_short_and_empty_text(rag):
+    assert rag.chunk_text(_words(3), chunk_size=10, overlap=2) == ["w0 w1 w2"]
+    assert rag.chunk_text("", chunk_size=10, overlap=2) == []
+
+class ByteEncoding:
+    """One token per UTF-8 byte, so windows can cut characters in half"""
+
+    def encode(self, text):
+        return list(text.encode())
+
+    def decode(self, tokens):
+        return bytes(tokens).decode(errors="replace")
+
+    def decode_single_token_bytes(self, token):
+        return bytes([token])
+
+    def decode_bytes(self, tokens):
+        return bytes(tokens)
+
+def test_chunk_drops_split_multibyte_characters(rag):
+    rag._encoding = ByteEncoding()
+    chunks = rag.chunk_text("é" * 10, chunk_size=3, overlap=1)
+    assert chunks
+    assert all(set(chunk) == {"é"} for chunk in chunks)
+
+def test_batch_ranges_reuse_chunk_token_counts(rag):
+    chunks, token_counts = rag._chunk_tokens(_words(30), chunk_size=10, overlap=2)
+    assert token_counts == [10, 10, 10, 6]
+    # Known counts are used as-is, without tokenizing the texts again
+    rag._encoding = None
+    rag.get_encoding = lambda: pytest.fail("texts were re-tokenized")
+    assert rag._batch_ranges(chunks, batch_size=2, token_counts=token_counts) == [(0, 2), (2, 4)]
+
+def test_top_k_indices_orders_best_first():
+    scores = np.array([0.1, 0.9, 0.4, 0.7, 0.2], dtype=np.float32)
+    assert top_k_indices(scores, 3).tolist() == [1, 3, 2]
+    assert top_k_indices(scores, 1).tolist() == [1]
+
+def test_top_k_indices_clamps_k():
+    scores = np.array([0.3, 0.8, 0.5], dtype=np.float32)
+    assert top_k_indices(scores, 10).tolist() == [1, 2, 0]
+    assert top_k_indices(scores, 0).tolist() == []
+    assert top_k_indices(scores, -1).tolist() == []
+    assert top_k_indices(np.empty(0, dtype=np.float32), 3).tolist() == []
+
+@pytest.mark.parametrize("use_index", [False, True])
+def test_search_vectors_ranks_and_clamps(rag, use_index):
+    rag.chunks = ["east", "north", "north-east", "west"]
+    rag.build_embeddings_matrix([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0], [-1.0, 0.0]])
+    if use_index:
+        rag.build_index()
+    else:
+        rag.index = None
+    query = np.array([[0.0, 1.0]], dtype=np.float32)
+
+    top = rag._search_vectors(query, top_k=2)[0]
+    assert [chunk for chunk, _ in top] == ["north", "north-east"]
+    assert top[0][1] == pytest.approx(1.0)
+    assert top[1][1] == pytest.approx(2 ** -0.5)
+    assert len(rag._search_vectors(query, top_k=10)[0]) == 4
+    assert rag._search_vectors(query, top_k=0) == [[]]
+
+def test_dispatcher_coalesces_concurrent_queries():
+    fake = FakeEmbeddings()
+    dispatcher = EmbeddingDispatcher(SimpleNamespace(embeddings=fake), MODEL, max_batch=4)
+
+    async def embed_all():
+        return await asyncio.gather(*(dispatcher.embed("q" * n) for n in range(1, 11)))
+
+    vectors = asyncio.run(embed_all())
+    # Each caller gets its own vector back, from batches of at most max_batch
+    assert [vec[0] for vec in vectors] == list(range(1, 11))
+    assert [len(batch) for batch in fake.inputs] == [4, 4, 2]
+
+class FailingEmbeddings:
+    async def create(self, input, model):
+        raise RuntimeError("embeddings down")
+
+def test_dispatcher_fails_every_waiting_future():
+    dispatcher = EmbeddingDispatcher(SimpleNamespace(embeddings=FailingEmbeddings()), MODEL)
+
+    async def embed_all():
+        return await asyncio.gather(*(dispatcher.embed(text) for text in ["a", "b", "c"]),
+                                    return_exceptions=True)
+
+    errors = asyncio.run(embed_all())
+    assert len(errors) == 3
+    assert all(isinstance(error, RuntimeError) for error in errors)
+
+def test_shared_dispatcher_must_match_model(cache):
+    dispatcher = EmbeddingDispatcher(SimpleNamespace(embeddings=FakeEmbeddings()), "other-model")
+    with pytest.raises(ValueError):
+        RAGTool(client=object(), async_client=object(), embedding_cache=cache, dispatcher=dispatcher)
+
+def test_fingerprint_reused_while_mtime_and_size_unchanged(tmp_path):
+    pdf = tmp_path / "doc.pdf"
+    pdf.write_bytes(b"first version")
+    stat = os.stat(pdf)
+    fingerprint = pdf_fingerprint(str(pdf), str(tmp_path))
+
+    # Same size and mtime: the stored hash is trusted, the file not re-read
+    pdf.write_bytes(b"other version")
+    os.utime(pdf, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert pdf_fingerprint(str(pdf), str(tmp_path)) == fingerprint
+
+    # ...including after a restart, from pdf_index.json
+    rag_tool._pdf_indexes.clear()
+    assert pdf_fingerprint(str(pdf), str(tmp_path)) == fingerprint
+
+    os.utime(pdf, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert pdf_fingerprint(str(pdf), str(tmp_path)) != fingerprint
+
+def test_fingerprint_matches_across_paths(tmp_path):
+    (tmp_path / "a.pdf").write_bytes(b"same bytes")
+    (tmp_path / "b.pdf").write_bytes(b"same bytes")
+    assert (pdf_fingerprint(str(tmp_path / "a.pdf"), str(tmp_path))
+            == pdf_fingerprint(str(tmp_path / "b.pdf"), str(tmp_path)))
+
+def _ingested(rag, tmp_path):
+    pdf = tmp_path / "doc.pdf"
+    pdf.write_bytes(b"%PDF-1.4 stand-in")
+    rag.chunks = ["alpha", "beta", "gamma"]
+    rag.build_embeddings_matrix(np.array([[3.0, 4.0], [0.0, 2.0], [1.0, 1.0]], dtype=np.float32))
+    rag.build_index()
+    return str(pdf)
+
+def test_save_and_load_embeddings_round_trip(rag, cache, tmp_path):
+    pdf = _ingested(rag, tmp_path)
+    npz_path = rag.save_embeddings(pdf, str(tmp_path))
+
+    with np.load(npz_path) as saved:
+        assert saved["chunks"].dtype.kind == "U"
+        assert saved["embeddings"].dtype == np.float16
+    sidecar = orjson.loads((tmp_path / os.path.basename(npz_path).replace(".npz", ".json")).read_bytes())
+    assert sidecar == {"pdf_path": pdf, "model": MODEL, "num_chunks": 3}
+
+    loaded = RAGTool(client=object(), async_client=object(), embedding_cache=cache)
+    assert loaded.load_embeddings(pdf, str(tmp_path))
+    assert loaded.chunks == ["alpha", "beta", "gamma"]
+    assert loaded.embeddings_matrix.dtype == np.float32
+    np.testing.assert_allclose(loaded.embeddings_matrix, rag.embeddings_matrix, atol=1e-3)
+
+def test_load_embeddings_rejects_other_model(rag, cache, tmp_path):
+    pdf = _ingested(rag, tmp_path)
+    rag.save_embeddings(pdf, str(tmp_path))
+    # Same PDF, but the cache files of another model are never looked at
+    other = RAGTool(client=object(), async_client=object(), embedding_cache=cache,
+                    embedding_model="text-embedding-3-large")
+    assert not other.load_embeddings(pdf, str(tmp_path))
+
+def _write_legacy_cache(tmp_path, model=MODEL):
+    (tmp_path / "resume_embeddings.json").write_bytes(orjson.dumps({
+        "pdf_path": "C:\\Users\\someone\\resume.pdf",
+        "chunks": ["first chunk", "second chunk"],
+        "embeddings": [[1.0, 0.0], [0.0, 2.0]],
+        "model": model,
+    }))
+
+def test_load_legacy_inline_json_cache(rag, tmp_path):
+    _write_legacy_cache(tmp_path)
+    assert rag.load_embeddings(str(tmp_path / "resume.pdf"), str(tmp_path))
+    assert rag.chunks == ["first chunk", "second chunk"]
+    np.testing.assert_allclose(rag.embeddings_matrix, [[1.0, 0.0], [0.0, 1.0]])
+
+def test_legacy_cache_ignored_while_pdf_exists_or_model_differs(rag, tmp_path):
+    _write_legacy_cache(tmp_path, model="text-embedding-ada-002")
+    assert not rag.load_embeddings(str(tmp_path / "resume.pdf"), str(tmp_path))
+
+    _write_legacy_cache(tmp_path)
+    # A file with this name may hold different bytes, so it is keyed by content
+    (tmp_path / "resume.pdf").write_bytes(b"%PDF-1.4 a new resume")
+    assert not rag.load_embeddings(str(tmp_path / "resume.pdf"), str(tmp_path))
+
+@pytest.mark.parametrize("retry_after, attempt, expected", [
+    ("3", 0, 3.0),
+    (None, 2, 4.0),
+    ("soon", 1, 2.0),
+    ("Wed, 21 Oct 2015 07:28:00 GMT", 3, 0.0),
+])
+def test_retry_delay_parses_retry_after(retry_after, attempt, expected):
+    # HTTP dates in the past mean "retry now"; unparseable values fall back to backoff
+    assert rag_tool._retry_delay(retry_after, attempt) == expected